@@ -17,19 +17,21 @@ TikTok Sentiment Analyzer - Main Streamlit Application
 
 import streamlit as st
 import pandas as pd
-import time
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
+from itertools import chain
+from typing import Optional
 
 # Import local modules
 from database import (
-    init_db, save_session, save_comments,
+    init_db, save_analysis,
     get_history, get_session_detail, delete_session
 )
 from scraper import scrape_comments_apify
-from sentiment import analyze_batch, get_sentiment_summary, get_top_words
+from sentiment import analyze_batch, get_sentiment_summary, get_top_words, get_result_tokens
 from visualization import (
     create_sentiment_pie, create_sentiment_bar,
-    create_wordcloud, create_score_histogram
+    create_wordcloud, create_score_histogram, fig_to_png, release_fig
 )
 from utils import clean_text, get_word_frequencies
 
@@ -125,11 +127,52 @@ def show_analysis_page():
             run_apify_analysis(keyword or "Apify Result", apify_url, token, max_comments)
 
 
+# Worker threads scoring comment batches while the scrape is streaming
+ANALYSIS_WORKERS = 4
+
+# Per-session render caches are keyed on ever-increasing session ids, so
+# cap how many sessions' tables/images stay cached
+SESSION_CACHE_ENTRIES = 32
+
+
+class NoCommentsError(Exception):
+    """Scrape finished without any comments (bad URL, blocked, or private)"""
+
+
+@st.cache_data(ttl=3600, show_spinner=False)
+def _scrape_and_analyze(video_url: str, max_comments: int, _api_token: str):
+    """
+    Scrape comments and analyze them while the dataset is still streaming
+    
+    Each batch the scraper reads is scored on a worker thread, so analysis
+    overlaps the network-bound download instead of following it. Cached
+    per (url, limit); the token is not part of the cache key.
+    
+    Returns:
+        Tuple of (scrape result, sentiment results in comment order)
+    
+    Raises:
+        NoCommentsError: nothing was fetched. st.cache_data doesn't cache
+            exceptions, so an empty run is retried on the next attempt.
+    """
+    with ThreadPoolExecutor(max_workers=ANALYSIS_WORKERS) as pool:
+        futures = []
+        result = scrape_comments_apify(
+            video_url, _api_token, max_comments,
+            on_batch=lambda texts: futures.append(pool.submit(analyze_batch, texts))
+        )
+        sentiments = list(chain.from_iterable(f.result() for f in futures))
+    
+    if not sentiments:
+        raise NoCommentsError(video_url)
+    
+    return result, sentiments
+
+
 def run_manual_analysis(keyword: str, comments_list: list):
     """Run analysis on manually provided comments"""
     with st.status("🔄 Sedang memproses...", expanded=True) as status:
         st.write(f"📝 Menganalisis {len(comments_list)} komentar...")
-        time.sleep(0.3)
         
         # Analyze
         analysis_results = analyze_batch(comments_list)
@@ -144,15 +187,15 @@ def run_manual_analysis(keyword: str, comments_list: list):
         summary = get_sentiment_summary(analysis_results)
         
         st.write("💾 Menyimpan hasil...")
-        session_id = save_session(
-            keyword=keyword,
-            total_comments=summary['total'],
-            positive_count=summary['positive_count'],
-            negative_count=summary['negative_count'],
-            neutral_count=summary['neutral_count'],
-            avg_sentiment_score=summary['avg_score']
-        )
-        save_comments(session_id, analysis_results)
+        session_id = save_analysis({
+            'keyword': keyword,
+            'total_comments': summary['total'],
+            'positive_count': summary['positive_count'],
+            'negative_count': summary['negative_count'],
+            'neutral_count': summary['neutral_count'],
+            'avg_sentiment_score': summary['avg_score']
+        }, analysis_results)
+        _invalidate_history_cache()
         
         st.session_state.analysis_results = {
             'keyword': keyword,
@@ -172,39 +215,36 @@ def run_apify_analysis(keyword: str, url: str, token: str, max_comments: int):
         st.write("Menghubungkan ke Apify Cloud...")
         
         try:
-            # Call Scraper
-            result = scrape_comments_apify(url, token, max_comments)
-            comments_data = result['comments']
-            
-            if not comments_data:
+            # Call Scraper (sentiment analysis runs alongside the download)
+            try:
+                result, sentiments = _scrape_and_analyze(url, max_comments, token)
+            except NoCommentsError:
                 st.error("Tidak ada komentar ditemukan atau akses ditolak.")
                 status.update(label="❌ Gagal", state="error")
                 return
+            columns = result['comments']  # one list per comment field
 
-            st.write(f"✅ Berhasil mengambil {len(comments_data)} komentar!")
-            st.write("Menganalisis sentimen...")
-            
-            # Extract text
-            texts = [c['comment_text'] for c in comments_data]
-            sentiments = analyze_batch(texts)
+            st.write(f"✅ Berhasil mengambil & menganalisis {len(sentiments)} komentar!")
             
-            # Merge
-            final_results = []
-            for i, s in enumerate(sentiments):
-                s.update(comments_data[i]) # Merge Apify data (username etc)
-                final_results.append(s)
+            # Merge Apify data (username etc) into the results, column by column
+            final_results = sentiments
+            for field, values in columns.items():
+                for r, value in zip(final_results, values):
+                    r[field] = value
+            for r in final_results:
+                r['video_url'] = url
             
             # Save
             summary = get_sentiment_summary(final_results)
-            session_id = save_session(
-                keyword=keyword,
-                total_comments=summary['total'],
-                positive_count=summary['positive_count'],
-                negative_count=summary['negative_count'],
-                neutral_count=summary['neutral_count'],
-                avg_sentiment_score=summary['avg_score']
-            )
-            save_comments(session_id, final_results)
+            session_id = save_analysis({
+                'keyword': keyword,
+                'total_comments': summary['total'],
+                'positive_count': summary['positive_count'],
+                'negative_count': summary['negative_count'],
+                'neutral_count': summary['neutral_count'],
+                'avg_sentiment_score': summary['avg_score']
+            }, final_results)
+            _invalidate_history_cache()
             
             st.session_state.analysis_results = {
                 'keyword': keyword,
@@ -247,38 +287,104 @@ def display_results():
     st.markdown("### 📈 Visualisasi")
     col1, col2 = st.columns(2)
     with col1:
-        st.pyplot(create_sentiment_pie(
+        st.image(_pie_png(
             summary['positive_count'], summary['negative_count'], summary['neutral_count']
         ))
     with col2:
-        wc_freq = get_word_frequencies([r['cleaned_text'] for r in results])
-        if wc_freq:
-            st.pyplot(create_wordcloud(wc_freq))
+        wc_png = _wordcloud_png(data['session_id'], results)
+        if wc_png:
+            st.image(wc_png)
     
     # Table
     st.markdown("### 📝 Detail")
-    df = pd.DataFrame([{
-        'User': r.get('username', '-'),
-        'Komentar': r.get('comment_text', ''),
-        'Sentimen': r.get('sentiment_label', 'neutral'),
-        'Skor': r.get('sentiment_score', 0)
-    } for r in results])
+    df = _results_frame(data['session_id'], results)
     st.dataframe(df, use_container_width=True)
 
 
+def _render_png(fig) -> bytes:
+    """Render a figure to PNG and hand it back to the figure pool"""
+    try:
+        return fig_to_png(fig)
+    finally:
+        release_fig(fig)
+
+
+@st.cache_data(max_entries=SESSION_CACHE_ENTRIES, show_spinner=False)
+def _pie_png(positive: int, negative: int, neutral: int) -> bytes:
+    """Sentiment pie as PNG, rendered once per distinct set of counts"""
+    return _render_png(create_sentiment_pie(positive, negative, neutral))
+
+
+@st.cache_data(max_entries=SESSION_CACHE_ENTRIES, show_spinner=False)
+def _wordcloud_png(session_id: int, _results: list) -> Optional[bytes]:
+    """Word cloud as PNG, generated once per saved session"""
+    wc_freq = get_word_frequencies([get_result_tokens(r) for r in _results])
+    if not wc_freq:
+        return None
+    return _render_png(create_wordcloud(wc_freq))
+
+
+@st.cache_data(max_entries=SESSION_CACHE_ENTRIES, show_spinner=False)
+def _results_frame(session_id: int, _results: list) -> pd.DataFrame:
+    """Build the detail table column-wise, once per saved session"""
+    return pd.DataFrame({
+        'User': [r.get('username', '-') for r in _results],
+        'Komentar': [r.get('comment_text', '') for r in _results],
+        'Sentimen': [r.get('sentiment_label', 'neutral') for r in _results],
+        'Skor': [r.get('sentiment_score', 0) for r in _results]
+    })
+
+
+@st.cache_data(ttl=60, show_spinner=False)
+def _cached_history(limit: int = 20) -> list:
+    """Recent sessions, reused across reruns for up to a minute"""
+    return get_history(limit)
+
+
+@st.cache_data(ttl=60, show_spinner=False)
+def _cached_session_detail(session_id: int):
+    """Session detail, reused across reruns for up to a minute"""
+    return get_session_detail(session_id)
+
+
+def _invalidate_history_cache():
+    """Drop cached history reads after sessions are saved or deleted"""
+    _cached_history.clear()
+    _cached_session_detail.clear()
+
+
+def _summary_from_session(session: dict) -> dict:
+    """Rebuild the summary dict from the aggregates stored on a session row"""
+    total = session['total_comments']
+    
+    def pct(count):
+        return round(count / total * 100, 1) if total else 0
+    
+    return {
+        'total': total,
+        'positive_count': session['positive_count'],
+        'negative_count': session['negative_count'],
+        'neutral_count': session['neutral_count'],
+        'positive_pct': pct(session['positive_count']),
+        'negative_pct': pct(session['negative_count']),
+        'neutral_pct': pct(session['neutral_count']),
+        'avg_score': session['avg_sentiment_score']
+    }
+
+
 def show_history_page():
     """History page"""
     st.markdown("### 📊 Riwayat")
-    history = get_history(20)
+    history = _cached_history(20)
     for item in history:
         with st.expander(f"{item['created_at']} - {item['keyword']}"):
             if st.button("Load", key=f"load_{item['id']}"):
-                detail = get_session_detail(item['id'])
+                detail = _cached_session_detail(item['id'])
                 if detail:
                     st.session_state.analysis_results = {
                         'keyword': item['keyword'],
                         'session_id': item['id'],
-                        'summary': get_sentiment_summary(detail['comments']), # re-calc summary or use db
+                        'summary': _summary_from_session(detail['session']),
                         'results': detail['comments'],
                         'videos': detail['videos']
                     }
@@ -286,6 +392,7 @@ def show_history_page():
                     st.rerun()
             if st.button("Delete", key=f"del_{item['id']}"):
                 delete_session(item['id'])
+                _invalidate_history_cache()
                 st.rerun()
 
 
@@ -4,7 +4,10 @@ Handles SQLite operations for storing search sessions, comments, and videos
 """
 
 import sqlite3
+import functools
 import os
+import json
+import threading
 from datetime import datetime
 from typing import List, Dict, Optional, Tuple
 
@@ -12,19 +15,116 @@ from typing import List, Dict, Optional, Tuple
 DB_PATH = os.path.join(os.path.dirname(__file__), 'data', 'sentiment.db')
 
 
+# Comment scores are stored as integer thousandths (scores are already
+# rounded to 3 decimals), which SQLite packs into 1-2 bytes instead of an
+# 8-byte REAL. Schema version 1 introduced this encoding.
+SCORE_SCALE = 1000
+
+# Comment labels are stored as small integers (schema version 2)
+LABEL_CODES = {'neutral': 0, 'positive': 1, 'negative': -1}
+LABEL_NAMES = {code: label for label, code in LABEL_CODES.items()}
+
+SCHEMA_VERSION = 2
+
+COMMENTS_TABLE_SQL = '''
+    CREATE TABLE IF NOT EXISTS comments (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        session_id INTEGER NOT NULL,
+        video_url TEXT,
+        username TEXT,
+        comment_text TEXT,
+        cleaned_text TEXT,
+        sentiment_score INTEGER,
+        sentiment_label INTEGER,
+        created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+        FOREIGN KEY (session_id) REFERENCES search_sessions(id)
+    )
+'''
+
+# Column layout of each table, used to build JSON row projections
+SESSION_COLUMNS = ('id', 'keyword', 'total_comments', 'positive_count', 'negative_count',
+                   'neutral_count', 'avg_sentiment_score', 'created_at')
+COMMENT_COLUMNS = ('id', 'session_id', 'video_url', 'username', 'comment_text',
+                   'cleaned_text', 'sentiment_score', 'sentiment_label', 'created_at')
+VIDEO_COLUMNS = ('id', 'session_id', 'video_url', 'video_title', 'author',
+                 'likes_count', 'comments_count', 'created_at')
+
+
+def _json_row(columns: Tuple[str, ...]) -> str:
+    """Build a json_object(...) expression packing the given columns"""
+    return 'json_object(' + ', '.join(f"'{c}', {c}" for c in columns) + ')'
+
+
+# Session, comments and videos fetched in one statement; the kind column
+# tells the rows apart (requires SQLite 3.38+ or the JSON1 extension)
+SESSION_DETAIL_SQL = f'''
+    SELECT 's' AS kind, id AS row_id, {_json_row(SESSION_COLUMNS)} AS data
+    FROM search_sessions WHERE id = ?
+    UNION ALL
+    SELECT 'c', id, {_json_row(COMMENT_COLUMNS)} FROM comments WHERE session_id = ?
+    UNION ALL
+    SELECT 'v', id, {_json_row(VIDEO_COLUMNS)} FROM videos WHERE session_id = ?
+    ORDER BY row_id
+'''
+
+
+# One connection for the whole process. Streamlit runs every rerun on a
+# fresh script thread, so a per-thread connection would be set up again on
+# almost every rerun; instead all threads share this one, and functions
+# using it are serialized by _DB_LOCK (see _serialized).
+_conn: Optional[sqlite3.Connection] = None
+_DB_LOCK = threading.RLock()
+
+
+def _serialized(func):
+    """Run func while holding the shared connection's lock"""
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        with _DB_LOCK:
+            return func(*args, **kwargs)
+    return wrapper
+
+
+@_serialized
 def get_connection() -> sqlite3.Connection:
-    """Create and return a database connection"""
+    """
+    Return the process-wide database connection, creating it on first use
+    
+    Callers outside this module must hold _DB_LOCK while using it.
+    """
+    global _conn
+    if _conn is not None:
+        return _conn
+    
     os.makedirs(os.path.dirname(DB_PATH), exist_ok=True)
-    conn = sqlite3.connect(DB_PATH)
+    conn = sqlite3.connect(DB_PATH, check_same_thread=False)
     conn.row_factory = sqlite3.Row
+    
+    # WAL + NORMAL sync: one fsync per committed transaction instead of
+    # journal churn on every write
+    conn.execute('PRAGMA journal_mode=WAL')
+    conn.execute('PRAGMA synchronous=NORMAL')
+    conn.execute('PRAGMA temp_store=MEMORY')
+    conn.execute('PRAGMA cache_size=-20000')
+    
+    _conn = conn
     return conn
 
 
+@_serialized
 def init_db() -> None:
     """Initialize database and create tables if not exist"""
     conn = get_connection()
     cursor = conn.cursor()
     
+    # Upgrade databases written by older versions before touching tables
+    version = cursor.execute('PRAGMA user_version').fetchone()[0]
+    has_comments = cursor.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'comments'"
+    ).fetchone()
+    if has_comments and version < SCHEMA_VERSION:
+        _migrate(conn)
+    
     # Create search_sessions table
     cursor.execute('''
         CREATE TABLE IF NOT EXISTS search_sessions (
@@ -40,20 +140,7 @@ def init_db() -> None:
     ''')
     
     # Create comments table
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS comments (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            session_id INTEGER NOT NULL,
-            video_url TEXT,
-            username TEXT,
-            comment_text TEXT,
-            cleaned_text TEXT,
-            sentiment_score REAL,
-            sentiment_label TEXT,
-            created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
-            FOREIGN KEY (session_id) REFERENCES search_sessions(id)
-        )
-    ''')
+    cursor.execute(COMMENTS_TABLE_SQL)
     
     # Create videos table
     cursor.execute('''
@@ -70,41 +157,85 @@ def init_db() -> None:
         )
     ''')
     
+    # Indexes for per-session lookups and deletes
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_comments_session ON comments(session_id)')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_videos_session ON videos(session_id)')
+    
+    # Create apify_cache table (raw scraper results, reused across restarts)
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS apify_cache (
+            video_url TEXT NOT NULL,
+            max_comments INTEGER NOT NULL,
+            payload TEXT NOT NULL,
+            fetched_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+            PRIMARY KEY (video_url, max_comments)
+        )
+    ''')
+    
+    # Setting user_version is a real write; init_db runs on every rerun
+    if cursor.execute('PRAGMA user_version').fetchone()[0] != SCHEMA_VERSION:
+        cursor.execute(f'PRAGMA user_version = {SCHEMA_VERSION}')
+    
     conn.commit()
-    conn.close()
 
 
-def save_session(keyword: str, total_comments: int, positive_count: int,
-                 negative_count: int, neutral_count: int, 
-                 avg_sentiment_score: float) -> int:
-    """
-    Save a new search session and return its ID
-    """
-    conn = get_connection()
-    cursor = conn.cursor()
-    
+def _migrate(conn: sqlite3.Connection) -> None:
+    """Upgrade existing data to SCHEMA_VERSION, all steps in one transaction"""
+    with conn:
+        # Take the write lock before reading the version: another app
+        # process may be running init_db on the same file, and migrating
+        # the same data twice would rescale scores again and reset every
+        # label
+        conn.execute('BEGIN IMMEDIATE')
+        version = conn.execute('PRAGMA user_version').fetchone()[0]
+        if version >= SCHEMA_VERSION:
+            return  # upgraded by another connection meanwhile
+        
+        if version < 1:
+            # v1: comment scores as integer thousandths
+            conn.execute('''
+                UPDATE comments
+                SET sentiment_score = CAST(ROUND(sentiment_score * ?) AS INTEGER)
+            ''', (SCORE_SCALE,))
+        
+        if version < 2:
+            # v2: labels as integer codes. TEXT affinity would turn stored
+            # integers back into strings, so rebuild the table with
+            # INTEGER columns (index is recreated by init_db)
+            conn.execute('ALTER TABLE comments RENAME TO comments_old')
+            conn.execute(COMMENTS_TABLE_SQL)
+            conn.execute('''
+                INSERT INTO comments
+                (id, session_id, video_url, username, comment_text, cleaned_text,
+                 sentiment_score, sentiment_label, created_at)
+                SELECT id, session_id, video_url, username, comment_text, cleaned_text,
+                       sentiment_score,
+                       CASE sentiment_label WHEN 'positive' THEN 1
+                                            WHEN 'negative' THEN -1
+                                            ELSE 0 END,
+                       created_at
+                FROM comments_old
+            ''')
+            conn.execute('DROP TABLE comments_old')
+        
+        conn.execute(f'PRAGMA user_version = {SCHEMA_VERSION}')
+
+
+def _insert_session(cursor: sqlite3.Cursor, keyword: str, total_comments: int,
+                    positive_count: int, negative_count: int, neutral_count: int,
+                    avg_sentiment_score: float) -> int:
+    """Insert a search session row and return its ID"""
     cursor.execute('''
         INSERT INTO search_sessions 
         (keyword, total_comments, positive_count, negative_count, neutral_count, avg_sentiment_score)
         VALUES (?, ?, ?, ?, ?, ?)
     ''', (keyword, total_comments, positive_count, negative_count, neutral_count, avg_sentiment_score))
     
-    session_id = cursor.lastrowid
-    conn.commit()
-    conn.close()
-    
-    return session_id
+    return cursor.lastrowid
 
 
-def save_comments(session_id: int, comments: List[Dict]) -> None:
-    """
-    Bulk insert comments for a session
-    comments: List of dicts with keys: video_url, username, comment_text, 
-              cleaned_text, sentiment_score, sentiment_label
-    """
-    conn = get_connection()
-    cursor = conn.cursor()
-    
+def _insert_comments(cursor: sqlite3.Cursor, session_id: int, comments: List[Dict]) -> None:
+    """Bulk insert comment rows for a session"""
     cursor.executemany('''
         INSERT INTO comments 
         (session_id, video_url, username, comment_text, cleaned_text, sentiment_score, sentiment_label)
@@ -115,21 +246,13 @@ def save_comments(session_id: int, comments: List[Dict]) -> None:
         c.get('username', ''),
         c.get('comment_text', ''),
         c.get('cleaned_text', ''),
-        c.get('sentiment_score', 0),
-        c.get('sentiment_label', 'neutral')
+        int(round(c.get('sentiment_score', 0) * SCORE_SCALE)),
+        LABEL_CODES.get(c.get('sentiment_label', 'neutral'), 0)
     ) for c in comments])
-    
-    conn.commit()
-    conn.close()
 
 
-def save_videos(session_id: int, videos: List[Dict]) -> None:
-    """
-    Save video information for a session
-    """
-    conn = get_connection()
-    cursor = conn.cursor()
-    
+def _insert_videos(cursor: sqlite3.Cursor, session_id: int, videos: List[Dict]) -> None:
+    """Bulk insert video rows for a session"""
     cursor.executemany('''
         INSERT INTO videos 
         (session_id, video_url, video_title, author, likes_count, comments_count)
@@ -142,11 +265,89 @@ def save_videos(session_id: int, videos: List[Dict]) -> None:
         v.get('likes_count', 0),
         v.get('comments_count', 0)
     ) for v in videos])
+
+
+@_serialized
+def save_analysis(session: Dict, comments: List[Dict],
+                  videos: Optional[List[Dict]] = None) -> int:
+    """
+    Save a session with its comments and videos in a single transaction
+    
+    Args:
+        session: Dict with keys: keyword, total_comments, positive_count,
+                 negative_count, neutral_count, avg_sentiment_score
+        comments: Comment dicts (see save_comments)
+        videos: Optional video dicts (see save_videos)
+    
+    Returns:
+        ID of the new session
+    """
+    conn = get_connection()
+    
+    with conn:
+        cursor = conn.cursor()
+        session_id = _insert_session(cursor, **session)
+        _insert_comments(cursor, session_id, comments)
+        if videos:
+            _insert_videos(cursor, session_id, videos)
+    
+    return session_id
+
+
+@_serialized
+def save_session(keyword: str, total_comments: int, positive_count: int,
+                 negative_count: int, neutral_count: int, 
+                 avg_sentiment_score: float) -> int:
+    """
+    Save a new search session and return its ID
+    """
+    conn = get_connection()
+    cursor = conn.cursor()
+    
+    session_id = _insert_session(cursor, keyword, total_comments, positive_count,
+                                 negative_count, neutral_count, avg_sentiment_score)
+    conn.commit()
+    return session_id
+
+
+@_serialized
+def save_comments(session_id: int, comments: List[Dict]) -> None:
+    """
+    Bulk insert comments for a session
+    comments: List of dicts with keys: video_url, username, comment_text, 
+              cleaned_text, sentiment_score, sentiment_label
+    """
+    conn = get_connection()
+    cursor = conn.cursor()
+    
+    _insert_comments(cursor, session_id, comments)
+    
+    conn.commit()
+
+
+@_serialized
+def save_videos(session_id: int, videos: List[Dict]) -> None:
+    """
+    Save video information for a session
+    """
+    conn = get_connection()
+    cursor = conn.cursor()
+    
+    _insert_videos(cursor, session_id, videos)
     
     conn.commit()
-    conn.close()
 
 
+def _decode_comment(comment: Dict) -> Dict:
+    """Convert a stored comment row back to its in-memory representation"""
+    # Rows saved before scores were required can hold NULL
+    score = comment['sentiment_score']
+    comment['sentiment_score'] = score / SCORE_SCALE if score is not None else 0.0
+    comment['sentiment_label'] = LABEL_NAMES[comment['sentiment_label']]
+    return comment
+
+
+@_serialized
 def get_history(limit: int = 20) -> List[Dict]:
     """
     Get recent search history
@@ -163,49 +364,41 @@ def get_history(limit: int = 20) -> List[Dict]:
     ''', (limit,))
     
     rows = cursor.fetchall()
-    conn.close()
     
     return [dict(row) for row in rows]
 
 
+@_serialized
 def get_session_detail(session_id: int) -> Optional[Dict]:
     """
     Get detailed information about a specific session
     """
     conn = get_connection()
-    cursor = conn.cursor()
+    rows = conn.execute(SESSION_DETAIL_SQL, (session_id, session_id, session_id)).fetchall()
     
-    # Get session info
-    cursor.execute('''
-        SELECT * FROM search_sessions WHERE id = ?
-    ''', (session_id,))
-    session = cursor.fetchone()
+    session = None
+    comments = []
+    videos = []
+    for row in rows:
+        data = json.loads(row['data'])
+        if row['kind'] == 's':
+            session = data
+        elif row['kind'] == 'c':
+            comments.append(_decode_comment(data))
+        else:
+            videos.append(data)
     
     if not session:
-        conn.close()
         return None
     
-    # Get comments
-    cursor.execute('''
-        SELECT * FROM comments WHERE session_id = ?
-    ''', (session_id,))
-    comments = cursor.fetchall()
-    
-    # Get videos
-    cursor.execute('''
-        SELECT * FROM videos WHERE session_id = ?
-    ''', (session_id,))
-    videos = cursor.fetchall()
-    
-    conn.close()
-    
     return {
-        'session': dict(session),
-        'comments': [dict(c) for c in comments],
-        'videos': [dict(v) for v in videos]
+        'session': session,
+        'comments': comments,
+        'videos': videos
     }
 
 
+@_serialized
 def get_session_comments(session_id: int) -> List[Dict]:
     """Get all comments for a session"""
     conn = get_connection()
@@ -216,11 +409,11 @@ def get_session_comments(session_id: int) -> List[Dict]:
     ''', (session_id,))
     
     rows = cursor.fetchall()
-    conn.close()
     
-    return [dict(row) for row in rows]
+    return [_decode_comment(dict(row)) for row in rows]
 
 
+@_serialized
 def delete_session(session_id: int) -> bool:
     """Delete a session and all related data"""
     conn = get_connection()
@@ -231,12 +424,40 @@ def delete_session(session_id: int) -> bool:
         cursor.execute('DELETE FROM videos WHERE session_id = ?', (session_id,))
         cursor.execute('DELETE FROM search_sessions WHERE id = ?', (session_id,))
         conn.commit()
-        conn.close()
         return True
     except Exception as e:
-        conn.close()
+        conn.rollback()
         return False
 
 
-# Initialize database on module import
-init_db()
+@_serialized
+def get_cached_scrape(video_url: str, max_comments: int,
+                      max_age_seconds: int) -> Optional[Dict]:
+    """
+    Get a cached scraper result if one younger than max_age_seconds exists
+    """
+    conn = get_connection()
+    cursor = conn.cursor()
+    
+    cursor.execute('''
+        SELECT payload FROM apify_cache
+        WHERE video_url = ? AND max_comments = ?
+          AND fetched_at >= datetime('now', ?)
+    ''', (video_url, max_comments, f'-{int(max_age_seconds)} seconds'))
+    
+    row = cursor.fetchone()
+    return json.loads(row['payload']) if row else None
+
+
+@_serialized
+def save_cached_scrape(video_url: str, max_comments: int, result: Dict) -> None:
+    """Store (or refresh) a scraper result in the cache"""
+    conn = get_connection()
+    cursor = conn.cursor()
+    
+    cursor.execute('''
+        INSERT OR REPLACE INTO apify_cache (video_url, max_comments, payload)
+        VALUES (?, ?, ?)
+    ''', (video_url, max_comments, json.dumps(result, ensure_ascii=False)))
+    
+    conn.commit()
@@ -4,33 +4,75 @@ Handles fetching comments from TikTok using Apify Client
 """
 
 from apify_client import ApifyClient
-from typing import List, Dict, Optional
+from itertools import islice
+from typing import Callable, List, Dict, Optional
 import os
 
+from database import init_db, get_cached_scrape, save_cached_scrape
+
 # Default Actor ID for TikTok Comment Scraper
 # Using 'clockworks/tiktok-comments-scraper' which is a popular choice
 # Alternative: 'mojura/tiktok-comment-scraper'
 ACTOR_ID = "clockworks/tiktok-comments-scraper"
 
+# How long a scraped result is reused before the actor is run again
+CACHE_TTL_SECONDS = 3600
+
+# Number of comments handed to the on_batch callback at a time
+STREAM_BATCH_SIZE = 64
+
+# Per-comment fields, returned column-wise (one list per field)
+COMMENT_FIELDS = ('comment_text', 'username', 'likes_count', 'reply_count', 'created_at')
+
 def scrape_comments_apify(
     video_url: str, 
     api_token: str, 
-    max_comments: int = 100
+    max_comments: int = 100,
+    use_cache: bool = True,
+    on_batch: Optional[Callable[[List[str]], None]] = None
 ) -> Dict:
     """
     Scrape TikTok comments using Apify
     
+    Actor runs are slow and billed, so results are cached in the local
+    database per (video_url, max_comments) for CACHE_TTL_SECONDS.
+    
     Args:
         video_url: URL of the TikTok video
         api_token: Apify API Token
         max_comments: Maximum number of comments to retrieve
+        use_cache: Reuse a recent cached result instead of re-running the actor
+        on_batch: Optional callback receiving comment texts in chunks of
+                  STREAM_BATCH_SIZE as they are read, so callers can start
+                  processing before the dataset has been fully fetched
         
     Returns:
-        Dict containing list of comments and video metadata
+        Dict with 'videos' (list of video metadata) and 'comments', a dict
+        of parallel lists keyed by COMMENT_FIELDS
     """
     if not api_token:
         raise ValueError("Apify API Token is required")
 
+    if use_cache:
+        cached = get_cached_scrape(video_url, max_comments, CACHE_TTL_SECONDS)
+        if cached is not None:
+            print(f"Using cached Apify result for {video_url}")
+            if on_batch:
+                texts = cached['comments']['comment_text']
+                for start in range(0, len(texts), STREAM_BATCH_SIZE):
+                    on_batch(texts[start:start + STREAM_BATCH_SIZE])
+            return cached
+    
+    result = _scrape_impl(video_url, api_token, max_comments, on_batch)
+    if result['comments']['comment_text']:
+        # Empty runs are usually transient failures; let the user retry
+        save_cached_scrape(video_url, max_comments, result)
+    return result
+
+
+def _scrape_impl(video_url: str, api_token: str, max_comments: int,
+                 on_batch: Optional[Callable[[List[str]], None]] = None) -> Dict:
+    """Run the Apify actor and collect its comments"""
     print(f"Starting Apify scraper for {video_url}...")
     
     # Initialize the ApifyClient with the API token
@@ -48,8 +90,14 @@ def scrape_comments_apify(
     
     print(f"Actor run finished. ID: {run['id']}")
 
-    # Fetch and print Actor results from the run's dataset (if there are any)
-    comments = []
+    # Fetch Actor results from the run's dataset (if there are any),
+    # straight into one list per field
+    comments = {field: [] for field in COMMENT_FIELDS}
+    texts = comments['comment_text']
+    usernames = comments['username']
+    likes = comments['likes_count']
+    replies = comments['reply_count']
+    created = comments['created_at']
     
     # Default metadata in case not found
     video_meta = {
@@ -60,24 +108,35 @@ def scrape_comments_apify(
         'comments_count': 0
     }
     
-    # Iterate over the items in the dataset
-    for item in client.dataset(run["defaultDatasetId"]).iterate_items():
+    # Iterate over the items in the dataset. The actor often overshoots
+    # commentsPerPost, so stop once we have enough and never read more
+    # than 2x the limit (headroom for items without text).
+    items = client.dataset(run["defaultDatasetId"]).iterate_items()
+    for item in islice(items, max_comments * 2):
         # Clean up and normalize data structure
         text = item.get('text', '')
         if not text:
             continue
-            
-        comments.append({
-            'comment_text': text,
-            'username': item.get('author', {}).get('uniqueId', 'user'),
-            'video_url': video_url,
-            # Apify specific fields might vary, trying to be safe
-            'likes_count': item.get('diggCount', 0),
-            'reply_count': item.get('replyCount', 0),
-            'created_at': item.get('createTimeISO', '')
-        })
+        
+        texts.append(text)
+        usernames.append(item.get('author', {}).get('uniqueId', 'user'))
+        # Apify specific fields might vary, trying to be safe
+        likes.append(item.get('diggCount', 0))
+        replies.append(item.get('replyCount', 0))
+        created.append(item.get('createTimeISO', ''))
+        
+        if on_batch and len(texts) % STREAM_BATCH_SIZE == 0:
+            on_batch(texts[-STREAM_BATCH_SIZE:])
+        
+        # Stop right away; pulling one more item could fetch another page
+        if len(texts) >= max_comments:
+            break
+    
+    # Flush the last partial batch
+    if on_batch and len(texts) % STREAM_BATCH_SIZE:
+        on_batch(texts[-(len(texts) % STREAM_BATCH_SIZE):])
 
-    print(f"Fetched {len(comments)} comments.")
+    print(f"Fetched {len(texts)} comments.")
     
     return {
         'videos': [video_meta], # Apify comment scraper might not return full video details, usually mostly comments
@@ -89,7 +148,8 @@ if __name__ == "__main__":
     # Test with a dummy token or prompt user
     token = os.environ.get("APIFY_TOKEN")
     if token:
+        init_db()
         res = scrape_comments_apify("https://www.tiktok.com/@...", token, 10)
-        print(f"Found {len(res['comments'])} comments")
+        print(f"Found {len(res['comments']['comment_text'])} comments")
     else:
         print("Set APIFY_TOKEN env var to test")
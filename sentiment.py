@@ -5,6 +5,8 @@ Uses lexicon-based approach with Indonesian sentiment dictionary
 
 import json
 import os
+from collections import Counter
+from itertools import chain
 from typing import List, Dict, Tuple
 from utils import clean_text, tokenize
 
@@ -14,22 +16,68 @@ LEXICON_PATH = os.path.join(os.path.dirname(__file__), 'assets', 'lexicon_id.jso
 # Global lexicon cache
 _lexicon = None
 
+# Flat token table built once from the lexicon. Each word maps to
+#   (score, next multiplier, next2 multiplier):
+#   score            -> signed sentiment value of the word
+#   next multiplier  -> factor it applies to the word right after it
+#                       (negator value x intensifier value)
+#   next2 multiplier -> factor it applies two words ahead
+#                       (half-strength intensifier)
+_token_table = None
+
+# Entry for words that are not in the lexicon
+_NEUTRAL_ENTRY = (0.0, 1.0, 1.0)
+
 
 def load_lexicon() -> Dict:
     """Load sentiment lexicon from JSON file"""
-    global _lexicon
+    global _lexicon, _token_table
     
     if _lexicon is not None:
         return _lexicon
     
     try:
         with open(LEXICON_PATH, 'r', encoding='utf-8') as f:
-            _lexicon = json.load(f)
-        return _lexicon
+            lexicon = json.load(f)
     except FileNotFoundError:
         print(f"Warning: Lexicon file not found at {LEXICON_PATH}")
-        _lexicon = {"positif": {}, "negatif": {}, "intensifier": {}, "negator": {}}
-        return _lexicon
+        lexicon = {"positif": {}, "negatif": {}, "intensifier": {}, "negator": {}}
+    
+    # Publish the token table before the lexicon: analysis batches run on
+    # worker threads, and one that sees _lexicon set returns early above,
+    # so _token_table must already be in place by then
+    _token_table = _build_token_table(lexicon)
+    _lexicon = lexicon
+    return _lexicon
+
+
+def _build_token_table(lexicon: Dict) -> Dict[str, Tuple[float, float, float]]:
+    """
+    Flatten the lexicon categories into one token table so the scorer
+    does a single lookup per word with no category branching
+    """
+    negator = lexicon.get('negator', {})
+    intensifier = lexicon.get('intensifier', {})
+    
+    # Positive words take precedence over negative ones
+    word_scores = {**lexicon.get('negatif', {}), **lexicon.get('positif', {})}
+    
+    table = {}
+    for word in set(word_scores) | set(negator) | set(intensifier):
+        table[word] = (
+            float(word_scores.get(word, 0.0)),
+            float(negator.get(word, 1) * intensifier.get(word, 1)),
+            float(intensifier[word] * 0.5) if word in intensifier else 1.0
+        )
+    
+    return table
+
+
+def _get_token_table() -> Dict[str, Tuple[float, float, float]]:
+    """Return the precomputed token table, loading the lexicon if needed"""
+    if _token_table is None:
+        load_lexicon()
+    return _token_table
 
 
 def calculate_sentiment_score(text: str) -> float:
@@ -41,51 +89,35 @@ def calculate_sentiment_score(text: str) -> float:
                     negative values = negative sentiment
                     around 0 = neutral
     """
-    lexicon = load_lexicon()
-    
-    # Clean and tokenize
     cleaned = clean_text(text, normalize=True)
-    words = tokenize(cleaned)
-    
+    return _score_tokens(tokenize(cleaned))
+
+
+def _score_tokens(words: List[str]) -> float:
+    """Score an already cleaned and tokenized text"""
     if not words:
         return 0.0
     
+    # Bind lookups to locals; this loop runs once per token of every comment
+    lookup = _get_token_table().get
+    neutral = _NEUTRAL_ENTRY
+    
     score = 0.0
-    prev_word = ""
-    prev_prev_word = ""
+    prev_multiplier = 1.0       # negator/intensifier effect of previous word
+    prev_prev_multiplier = 1.0  # reduced intensifier effect of word two back
+    pending_multiplier = 1.0    # becomes prev_prev_multiplier on next word
     
-    for i, word in enumerate(words):
-        word_score = 0.0
-        
-        # Check positive words
-        if word in lexicon.get('positif', {}):
-            word_score = lexicon['positif'][word]
-        
-        # Check negative words
-        elif word in lexicon.get('negatif', {}):
-            word_score = lexicon['negatif'][word]
+    for word in words:
+        word_score, next_multiplier, next2_multiplier = lookup(word, neutral)
+        if word_score:
+            score += word_score * prev_multiplier * prev_prev_multiplier
         
-        # Apply negator (reverses sentiment)
-        if prev_word in lexicon.get('negator', {}):
-            negator_value = lexicon['negator'][prev_word]
-            word_score = word_score * negator_value
-        
-        # Apply intensifier (amplifies sentiment)
-        if prev_word in lexicon.get('intensifier', {}):
-            intensifier_value = lexicon['intensifier'][prev_word]
-            word_score = word_score * intensifier_value
-        
-        # Check two words back for intensifier
-        if prev_prev_word in lexicon.get('intensifier', {}):
-            intensifier_value = lexicon['intensifier'][prev_prev_word]
-            word_score = word_score * (intensifier_value * 0.5)  # Reduced effect
-        
-        score += word_score
-        prev_prev_word = prev_word
-        prev_word = word
+        prev_prev_multiplier = pending_multiplier
+        pending_multiplier = next2_multiplier
+        prev_multiplier = next_multiplier
     
-    # Normalize by text length (with minimum)
-    normalized_score = score / max(len(words), 1)
+    # Normalize by text length
+    normalized_score = score / len(words)
     
     return round(normalized_score, 3)
 
@@ -117,35 +149,48 @@ def analyze_text(text: str) -> Dict:
     Analyze sentiment of a single text
     
     Returns:
-        Dict with score, label, and cleaned text
+        Dict with score, label, cleaned text and tokens
     """
-    cleaned = clean_text(text, normalize=True)
-    score = calculate_sentiment_score(text)
-    label = classify_sentiment(score)
-    
-    return {
-        'original_text': text,
-        'cleaned_text': cleaned,
-        'sentiment_score': score,
-        'sentiment_label': label
-    }
+    return analyze_batch([text])[0]
 
 
 def analyze_batch(texts: List[str]) -> List[Dict]:
     """
     Analyze sentiment for a batch of texts
     
+    Each text is cleaned and tokenized exactly once; the tokens feed the
+    scorer and are kept on the result ('tokens') so word counting and
+    word clouds don't tokenize again.
+    
     Args:
         texts: List of text strings
     
     Returns:
         List of analysis results
     """
-    results = []
-    for text in texts:
-        result = analyze_text(text)
-        results.append(result)
-    return results
+    cleaned = [clean_text(t, normalize=True) for t in texts]
+    token_lists = [tokenize(c) for c in cleaned]
+    scores = [_score_tokens(tokens) for tokens in token_lists]
+    labels = [classify_sentiment(score) for score in scores]
+    
+    return [{
+        'original_text': text,
+        'cleaned_text': clean,
+        'tokens': tokens,
+        'sentiment_score': score,
+        'sentiment_label': label
+    } for text, clean, tokens, score, label in zip(texts, cleaned, token_lists, scores, labels)]
+
+
+def get_result_tokens(result: Dict) -> List[str]:
+    """
+    Tokens of an analysis result, reusing the ones stored at analysis time
+    (results loaded from the database only carry cleaned_text)
+    """
+    tokens = result.get('tokens')
+    if tokens is None:
+        tokens = tokenize(result['cleaned_text'])
+    return tokens
 
 
 def get_sentiment_summary(results: List[Dict]) -> Dict:
@@ -168,9 +213,10 @@ def get_sentiment_summary(results: List[Dict]) -> Dict:
         }
     
     total = len(results)
-    positive = sum(1 for r in results if r['sentiment_label'] == 'positive')
-    negative = sum(1 for r in results if r['sentiment_label'] == 'negative')
-    neutral = sum(1 for r in results if r['sentiment_label'] == 'neutral')
+    label_counts = Counter(r['sentiment_label'] for r in results)
+    positive = label_counts['positive']
+    negative = label_counts['negative']
+    neutral = label_counts['neutral']
     avg_score = sum(r['sentiment_score'] for r in results) / total
     
     return {
@@ -197,20 +243,12 @@ def get_top_words(results: List[Dict], sentiment: str = None, top_n: int = 20) -
     Returns:
         Dict of word: count
     """
-    word_freq = {}
+    filtered = (r for r in results if not sentiment or r['sentiment_label'] == sentiment)
+    words = chain.from_iterable(get_result_tokens(r) for r in filtered)
     
-    for result in results:
-        if sentiment and result['sentiment_label'] != sentiment:
-            continue
-        
-        words = tokenize(result['cleaned_text'])
-        for word in words:
-            if len(word) > 2:  # Skip short words
-                word_freq[word] = word_freq.get(word, 0) + 1
-    
-    # Sort by frequency and return top N
-    sorted_words = sorted(word_freq.items(), key=lambda x: x[1], reverse=True)
-    return dict(sorted_words[:top_n])
+    # Skip short words; most_common keeps a heap of top_n instead of a full sort
+    word_freq = Counter(w for w in words if len(w) > 2)
+    return dict(word_freq.most_common(top_n))
 
 
 # Quick test
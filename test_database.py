@@ -0,0 +1,99 @@
+"""Tests for upgrading databases written by older versions"""
+import os
+import sqlite3
+import tempfile
+
+import database
+
+# Schema as created by the first release: REAL scores, TEXT labels, no
+# user_version
+V0_SCHEMA = '''
+    CREATE TABLE search_sessions (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        keyword TEXT NOT NULL,
+        total_comments INTEGER DEFAULT 0,
+        positive_count INTEGER DEFAULT 0,
+        negative_count INTEGER DEFAULT 0,
+        neutral_count INTEGER DEFAULT 0,
+        avg_sentiment_score REAL DEFAULT 0,
+        created_at DATETIME DEFAULT CURRENT_TIMESTAMP
+    );
+    CREATE TABLE comments (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        session_id INTEGER NOT NULL,
+        video_url TEXT,
+        username TEXT,
+        comment_text TEXT,
+        cleaned_text TEXT,
+        sentiment_score REAL,
+        sentiment_label TEXT,
+        created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+        FOREIGN KEY (session_id) REFERENCES search_sessions(id)
+    );
+    CREATE TABLE videos (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        session_id INTEGER NOT NULL,
+        video_url TEXT,
+        video_title TEXT,
+        author TEXT,
+        likes_count INTEGER DEFAULT 0,
+        comments_count INTEGER DEFAULT 0,
+        created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+        FOREIGN KEY (session_id) REFERENCES search_sessions(id)
+    );
+'''
+
+V0_COMMENTS = [
+    # (comment_text, sentiment_score, sentiment_label)
+    ('bagus banget', 0.5, 'positive'),
+    ('jelek parah', -0.333, 'negative'),
+    ('biasa aja', 0.0, 'neutral'),
+    ('tanpa skor', None, 'neutral'),
+]
+
+
+def _use_database(path):
+    """Point the database module at path with a fresh connection"""
+    if database._conn is not None:
+        database._conn.close()
+        database._conn = None
+    database.DB_PATH = path
+
+
+def test_migrate_v0_database():
+    original_path = database.DB_PATH
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'sentiment.db')
+        
+        conn = sqlite3.connect(path)
+        conn.executescript(V0_SCHEMA)
+        conn.execute("INSERT INTO search_sessions (keyword, total_comments) VALUES ('lama', 4)")
+        conn.executemany(
+            'INSERT INTO comments (session_id, comment_text, sentiment_score, sentiment_label) '
+            'VALUES (1, ?, ?, ?)', V0_COMMENTS)
+        conn.commit()
+        conn.close()
+        
+        try:
+            _use_database(path)
+            database.init_db()
+            database.init_db()  # must not migrate the data a second time
+            
+            version = database.get_connection().execute('PRAGMA user_version').fetchone()[0]
+            assert version == database.SCHEMA_VERSION
+            
+            comments = database.get_session_detail(1)['comments']
+            assert [(c['comment_text'], c['sentiment_score'], c['sentiment_label'])
+                    for c in comments] == [
+                ('bagus banget', 0.5, 'positive'),
+                ('jelek parah', -0.333, 'negative'),
+                ('biasa aja', 0.0, 'neutral'),
+                ('tanpa skor', 0.0, 'neutral'),
+            ]
+        finally:
+            _use_database(original_path)
+
+
+if __name__ == "__main__":
+    test_migrate_v0_database()
+    print('All database tests passed')
@@ -0,0 +1,39 @@
+"""Tests for lazy lexicon loading under concurrent first use"""
+import threading
+
+import sentiment
+from sentiment import analyze_batch
+
+
+def test_concurrent_first_use_loads_lexicon_once_ready():
+    texts = ['Bagus banget produknya', 'Jelek parah, nyesel beli', 'Biasa aja sih']
+    expected = analyze_batch(texts)
+    
+    # Like the app's analysis workers: several threads hit a cold lexicon
+    # cache at the same moment
+    for _ in range(50):
+        sentiment._lexicon = None
+        sentiment._token_table = None
+        barrier = threading.Barrier(8)
+        results, errors = [], []
+        
+        def worker():
+            barrier.wait()
+            try:
+                results.append(analyze_batch(texts))
+            except Exception as e:
+                errors.append(e)
+        
+        threads = [threading.Thread(target=worker) for _ in range(8)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        
+        assert not errors, errors
+        assert all(r == expected for r in results)
+
+
+if __name__ == "__main__":
+    test_concurrent_first_use_loads_lexicon_once_ready()
+    print('All lexicon loading tests passed')
@@ -0,0 +1,79 @@
+"""Regression tests for clean_text against the original unfused pipeline"""
+import random
+import re
+
+import pandas as pd
+
+from utils import (
+    clean_batch, clean_series, clean_text, normalize_slang, remove_emojis, remove_extra_whitespace,
+    remove_mentions, remove_numbers, remove_urls
+)
+
+
+def reference_clean_text(text, normalize=True):
+    """The original clean_text: one pass per cleaning step, in order"""
+    if not text or not isinstance(text, str):
+        return ""
+    text = text.lower()
+    text = remove_urls(text)
+    text = remove_mentions(text)
+    text = re.sub(r'#(\w+)', r'\1', text)
+    text = remove_emojis(text)
+    text = re.sub(r'[^\w\s]', ' ', text)
+    text = remove_numbers(text)
+    if normalize:
+        text = normalize_slang(text)
+    text = remove_extra_whitespace(text)
+    return text.strip()
+
+
+CASES = [
+    '#한국 bagus', '#日本', '#ＡＢＣ', 'gak bagus #한국', '#bagus🔥keren',
+    '#a한b', '@한국 bagus', '@user #fyp mantap!!', 'Bagus banget!',
+    'https://x.com/a?b=1#frag bagus', 'www.foo.id#tag', 'a😀5 #2024',
+    '🔥🔥🔥', '#🔥abc', '@🔥abc', 'café ÄÖ #Café', 'x-1 12.5 abc#5',
+    '', None, 123,
+]
+
+PIECES = [
+    'bagus', 'gak', 'BANGET', 'yg', '#', '@', '#fyp', '#한국', '#日本',
+    '#ＡＢＣ', 'ＡＢＣ', '한국', '日本', '😀', '🔥', '❤️', '‍', 'Ⓜ', '#Ⓜx',
+    '123', '12.5', '_x_', '!!!', 'https://t.co/x', 'www.a.id', 'café',
+    ' ', '  ', '\n', '\t', '-', '.',
+]
+
+
+def test_known_cases():
+    for text in CASES:
+        for normalize in (True, False):
+            assert clean_text(text, normalize) == reference_clean_text(text, normalize), text
+
+
+def test_hashtag_keeps_no_emoji_class_characters():
+    assert clean_text('#한국 bagus') == 'bagus'
+    assert clean_text('#日本') == ''
+    assert clean_text('#ＡＢＣ') == ''
+
+
+def test_randomized_matches_reference():
+    rng = random.Random(0)
+    for _ in range(20000):
+        text = ''.join(rng.choice(PIECES) for _ in range(rng.randint(1, 8)))
+        for normalize in (True, False):
+            assert clean_text(text, normalize) == reference_clean_text(text, normalize), repr(text)
+
+
+def test_clean_series_matches_clean_batch():
+    texts = ['Bagus banget!', None, '#한국 bagus', 'Bagus banget!', float('nan'), 'gak 🔥']
+    expected = [t if isinstance(t, str) else '' for t in texts]
+    cleaned = clean_series(pd.Series(texts))
+    assert cleaned.tolist() == clean_batch(expected)
+    assert cleaned.index.equals(pd.RangeIndex(len(texts)))
+
+
+if __name__ == "__main__":
+    test_known_cases()
+    test_hashtag_keeps_no_emoji_class_characters()
+    test_randomized_matches_reference()
+    test_clean_series_matches_clean_batch()
+    print('All clean_text regression tests passed')
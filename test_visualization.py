@@ -0,0 +1,39 @@
+"""Tests for word cloud layout caching"""
+import numpy as np
+
+import visualization
+from visualization import create_wordcloud, release_fig
+
+WORD_FREQ = {'bagus': 50, 'keren': 40, 'mantap': 35, 'jelek': 20, 'biasa': 25}
+TIED_FREQ = {'aaa': 5, 'bbb': 5, 'ccc': 5, 'ddd': 3}
+
+
+def render(word_freq, colormap):
+    fig = create_wordcloud(word_freq, colormap=colormap)
+    image = np.array(fig.axes[0].images[0].get_array())
+    release_fig(fig)
+    return image
+
+
+def cold_render(word_freq, colormap):
+    visualization._WORDCLOUD_LAYOUTS.clear()
+    return render(word_freq, colormap)
+
+
+def test_wordcloud_independent_of_earlier_renders():
+    expected = cold_render(WORD_FREQ, 'Greens')
+    cold_render(WORD_FREQ, 'Reds')
+    assert np.array_equal(render(WORD_FREQ, 'Greens'), expected)
+
+
+def test_wordcloud_respects_frequency_order():
+    reordered = dict(reversed(list(TIED_FREQ.items())))
+    expected = cold_render(reordered, 'viridis')
+    cold_render(TIED_FREQ, 'viridis')
+    assert np.array_equal(render(reordered, 'viridis'), expected)
+
+
+if __name__ == "__main__":
+    test_wordcloud_independent_of_earlier_renders()
+    test_wordcloud_respects_frequency_order()
+    print('All visualization tests passed')
@@ -6,7 +6,14 @@ Handles cleaning, normalization, and text preparation
 import re
 import json
 import os
-from typing import List
+import multiprocessing
+from collections import Counter
+from functools import lru_cache, partial
+from itertools import chain
+from typing import TYPE_CHECKING, List, Optional, Union
+
+if TYPE_CHECKING:
+    import pandas as pd
 
 # Common Indonesian slang normalization
 SLANG_DICT = {
@@ -136,56 +143,75 @@ SLANG_DICT = {
     'hiks': 'sedih'
 }
 
+# Cleaning patterns, compiled once at import
+# Emoji class. The classic emoji ranges (emoticons, pictographs, transport,
+# flags, dingbats, U+2600-U+2B55, ...) all fall inside U+24C2-U+10FFFF, so
+# the class is written as its merged form: that span plus the four smaller
+# code points (ZWJ, watch, eject, fast-forward). Fewer ranges make the
+# per-character membership test cheaper.
+_EMOJI_CLASS = (
+    "["
+    u"\u200d"
+    u"\u231a"
+    u"\u23cf"
+    u"\u23e9"
+    u"\U000024C2-\U0010ffff"
+    "]+"
+)
+_EMOJI_RE = re.compile(_EMOJI_CLASS)
+_URL_RE = re.compile(r'https?://\S+|www\.\S+')
+_MENTION_RE = re.compile(r'@\w+')
+_HASHTAG_RE = re.compile(r'#\w+')
+_NUMBER_RE = re.compile(r'\b\d+\b')
+
+# Fused passes used by clean_text. Replacing each match with the hashtag
+# word (empty for the other branches) / a space reproduces the separate
+# remove_* steps exactly, as long as URLs are stripped beforehand. On the
+# emoji variant the kept hashtag word must itself be emoji-stripped, since
+# \w also matches characters inside the emoji class (CJK, Hangul,
+# fullwidth forms) and replacement text is never rescanned; see
+# _mention_hashtag_emoji_repl.
+_MENTION_HASHTAG_EMOJI_RE = re.compile(r'@\w+|#(\w+)|' + _EMOJI_CLASS)
+_MENTION_HASHTAG_RE = re.compile(r'@\w+|#(\w+)')  # ASCII-only input
+_SPECIAL_CHARS_NUMBER_RE = re.compile(r'[^\w\s]|\b\d+\b')
+
+# Number of distinct texts memoized by clean_text, per normalize flag.
+# Scraped comment sections repeat a lot ("first", "🔥🔥🔥", spam).
+CLEAN_CACHE_SIZE = 8192
+
+# Smallest batch clean_batch will spread across processes; below this,
+# pool start-up and pickling cost more than the cleaning itself
+PARALLEL_MIN_BATCH = 5000
+
 
 def remove_emojis(text: str) -> str:
     """Remove emojis from text"""
-    emoji_pattern = re.compile(
-        "["
-        u"\U0001F600-\U0001F64F"  # emoticons
-        u"\U0001F300-\U0001F5FF"  # symbols & pictographs
-        u"\U0001F680-\U0001F6FF"  # transport & map symbols
-        u"\U0001F1E0-\U0001F1FF"  # flags
-        u"\U00002702-\U000027B0"
-        u"\U000024C2-\U0001F251"
-        u"\U0001f926-\U0001f937"
-        u"\U00010000-\U0010ffff"
-        u"\u2640-\u2642"
-        u"\u2600-\u2B55"
-        u"\u200d"
-        u"\u23cf"
-        u"\u23e9"
-        u"\u231a"
-        u"\ufe0f"
-        u"\u3030"
-        "]+",
-        flags=re.UNICODE
-    )
-    return emoji_pattern.sub('', text)
+    return _EMOJI_RE.sub('', text)
 
 
 def remove_urls(text: str) -> str:
     """Remove URLs from text"""
-    url_pattern = re.compile(r'https?://\S+|www\.\S+')
-    return url_pattern.sub('', text)
+    return _URL_RE.sub('', text)
 
 
 def remove_mentions(text: str) -> str:
     """Remove @mentions from text"""
-    return re.sub(r'@\w+', '', text)
+    return _MENTION_RE.sub('', text)
 
 
 def remove_hashtags(text: str) -> str:
     """Remove #hashtags from text"""
-    return re.sub(r'#\w+', '', text)
+    return _HASHTAG_RE.sub('', text)
 
 
 def remove_numbers(text: str) -> str:
     """Remove standalone numbers"""
-    return re.sub(r'\b\d+\b', '', text)
+    return _NUMBER_RE.sub('', text)
 
 
 def remove_extra_whitespace(text: str) -> str:
     """Remove extra whitespace and normalize spaces"""
+    # split/join runs 3-4x faster than re.sub(r'\s+', ' ', text).strip()
     return ' '.join(text.split())
 
 
@@ -202,6 +228,14 @@ def normalize_slang(text: str) -> str:
     return ' '.join(normalized)
 
 
+def _mention_hashtag_emoji_repl(match: re.Match) -> str:
+    """Replacement for _MENTION_HASHTAG_EMOJI_RE matches"""
+    word = match.group(1)
+    if word is None:
+        return ''  # mention or emoji run
+    return _EMOJI_RE.sub('', word)
+
+
 def clean_text(text: str, normalize: bool = True) -> str:
     """
     Full text cleaning pipeline
@@ -216,40 +250,101 @@ def clean_text(text: str, normalize: bool = True) -> str:
     if not text or not isinstance(text, str):
         return ""
     
-    # Convert to lowercase
-    text = text.lower()
+    return (_clean_norm if normalize else _clean_no_norm)(text)
+
+
+def _compile_pipeline(normalize: bool):
+    """
+    Build the clean_text body for one fixed normalize flag
     
-    # Remove URLs
-    text = remove_urls(text)
+    The flag is resolved here, once, rather than branched on for every
+    comment, and each variant is memoized on the text alone. The last
+    step is either normalize_slang, whose split/join output is already
+    whitespace-collapsed and stripped, or remove_extra_whitespace; never
+    both, as the unspecialized pipeline did.
+    """
+    url_sub = _URL_RE.sub
+    mention_hashtag_sub = _MENTION_HASHTAG_RE.sub
+    mention_hashtag_emoji_sub = _MENTION_HASHTAG_EMOJI_RE.sub
+    special_chars_number_sub = _SPECIAL_CHARS_NUMBER_RE.sub
+    finish = normalize_slang if normalize else remove_extra_whitespace
     
-    # Remove mentions
-    text = remove_mentions(text)
+    @lru_cache(maxsize=CLEAN_CACHE_SIZE)
+    def clean(text: str) -> str:
+        # Lowercase, then remove URLs (first, so the passes below never
+        # see URL fragments)
+        text = url_sub('', text.lower())
+        
+        # Remove mentions and emojis, keep hashtag words without '#'.
+        # Emojis are never ASCII, so plain-ASCII comments (the common case)
+        # skip the expensive emoji character class.
+        if text.isascii():
+            text = mention_hashtag_sub(r'\1', text)
+        else:
+            text = mention_hashtag_emoji_sub(_mention_hashtag_emoji_repl, text)
+        
+        # Turn special characters and standalone numbers into spaces; the
+        # extra spaces are collapsed by finish, so numbers end up removed
+        text = special_chars_number_sub(' ', text)
+        
+        return finish(text)
     
-    # Remove hashtags (keep the word, remove #)
-    text = re.sub(r'#(\w+)', r'\1', text)
+    return clean
+
+
+_clean_norm = _compile_pipeline(normalize=True)
+_clean_no_norm = _compile_pipeline(normalize=False)
+
+
+def clean_batch(texts: List[str], normalize: bool = True,
+                n_jobs: Optional[int] = None) -> List[str]:
+    """
+    Clean a batch of texts
     
-    # Remove emojis
-    text = remove_emojis(text)
+    Each distinct text is cleaned once per batch and duplicates reuse the
+    result, so spammy comment sections don't outgrow clean_text's cache
+    and parallel runs don't ship repeated strings to the workers.
     
-    # Remove special characters but keep Indonesian characters
-    text = re.sub(r'[^\w\s]', ' ', text)
+    Args:
+        texts: Raw comment texts
+        normalize: Whether to normalize slang words
+        n_jobs: Worker processes for large batches (-1 = all cores,
+                None = serial). Batches with fewer than PARALLEL_MIN_BATCH
+                distinct texts are always cleaned serially.
     
-    # Remove numbers
-    text = remove_numbers(text)
+    Returns:
+        Cleaned texts, in input order
+    """
+    if n_jobs == -1:
+        n_jobs = os.cpu_count() or 1
     
-    # Normalize slang
-    if normalize:
-        text = normalize_slang(text)
+    unique = list(dict.fromkeys(texts))
     
-    # Remove extra whitespace
-    text = remove_extra_whitespace(text)
+    if n_jobs and n_jobs > 1 and len(unique) >= PARALLEL_MIN_BATCH:
+        # Large chunks keep IPC round-trips few
+        chunksize = max(64, len(unique) // (n_jobs * 4))
+        with multiprocessing.Pool(n_jobs) as pool:
+            cleaned = pool.map(partial(clean_text, normalize=normalize), unique, chunksize=chunksize)
+    else:
+        cleaned = [clean_text(t, normalize) for t in unique]
     
-    return text.strip()
+    if len(unique) == len(texts):
+        return cleaned
+    memo = dict(zip(unique, cleaned))
+    return [memo[t] for t in texts]
 
 
-def clean_batch(texts: List[str], normalize: bool = True) -> List[str]:
-    """Clean a batch of texts"""
-    return [clean_text(t, normalize) for t in texts]
+def clean_series(series: 'pd.Series', normalize: bool = True) -> 'pd.Series':
+    """
+    Clean a pandas Series of texts
+    
+    Each distinct value is cleaned once and the results are mapped back
+    onto the column, so duplicate comments cost a hash lookup instead of
+    a trip through the regex pipeline. Missing values become "".
+    """
+    uniques = series.dropna().unique()
+    mapping = dict(zip(uniques, clean_batch(list(uniques), normalize)))
+    return series.map(mapping).fillna('')
 
 
 def tokenize(text: str) -> List[str]:
@@ -257,12 +352,15 @@ def tokenize(text: str) -> List[str]:
     return text.split()
 
 
-def get_word_frequencies(texts: List[str]) -> dict:
-    """Get word frequencies from a list of texts"""
-    freq = {}
-    for text in texts:
-        words = tokenize(text)
-        for word in words:
-            if len(word) > 2:  # Skip very short words
-                freq[word] = freq.get(word, 0) + 1
-    return dict(sorted(freq.items(), key=lambda x: x[1], reverse=True))
+def get_word_frequencies(texts: List[Union[str, List[str]]]) -> dict:
+    """
+    Get word frequencies from a list of texts
+    
+    Each item may be a cleaned text or an already tokenized list of words,
+    so callers holding tokens from the analysis step skip re-tokenizing.
+    """
+    words = chain.from_iterable(
+        tokenize(text) if isinstance(text, str) else text for text in texts
+    )
+    freq = Counter(w for w in words if len(w) > 2)  # Skip very short words
+    return dict(freq.most_common())
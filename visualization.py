@@ -4,11 +4,18 @@ Creates charts, word clouds, and other visualizations
 """
 
 import matplotlib.pyplot as plt
+import numpy as np
 import matplotlib
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.figure import Figure
 from wordcloud import WordCloud
+from collections import Counter, OrderedDict
+from functools import lru_cache
+from random import Random
 from typing import List, Dict, Optional
 import io
 import base64
+import threading
 
 # Use non-interactive backend for Streamlit
 matplotlib.use('Agg')
@@ -22,6 +29,54 @@ COLORS = {
     'text': '#ffffff'
 }
 
+# Word cloud colormap per sentiment label
+SENTIMENT_COLORMAPS = {
+    'positive': 'Greens',
+    'negative': 'Reds',
+    'neutral': 'Greys'
+}
+
+# Blank figures kept for reuse, per figsize. Figures are built with
+# matplotlib.figure.Figure directly, so pyplot never tracks (and leaks) them.
+FIG_POOL_SIZE = 4
+_FIG_POOL: Dict[tuple, List[Figure]] = {}
+_FIG_POOL_LOCK = threading.Lock()
+
+# Guards the shared WordCloud instances (generation mutates their layout)
+_WORDCLOUD_LOCK = threading.Lock()
+
+# Finished word layouts (placement and colors) by (frequency items in
+# order, colormap, max_words), least recently used first. Placement is the
+# slow part of a word cloud. The key covers every input the layout depends
+# on (frequency ties are broken by insertion order), so a hit is exactly
+# what a fresh generation would produce.
+WORDCLOUD_LAYOUT_CACHE_SIZE = 32
+_WORDCLOUD_LAYOUTS = OrderedDict()
+
+
+def _acquire_fig(figsize: tuple) -> Figure:
+    """Take a blank figure of the given size from the pool, or create one"""
+    with _FIG_POOL_LOCK:
+        pool = _FIG_POOL.get(figsize)
+        if pool:
+            return pool.pop()
+    return Figure(figsize=figsize, facecolor='#0e1117', layout='constrained')
+
+
+def release_fig(fig: Figure):
+    """
+    Return a figure from one of the create_* functions to the pool
+    
+    Call once the figure has been rendered (e.g. with fig_to_png);
+    it must not be used afterwards.
+    """
+    fig.clear()
+    figsize = tuple(fig.get_size_inches())
+    with _FIG_POOL_LOCK:
+        pool = _FIG_POOL.setdefault(figsize, [])
+        if len(pool) < FIG_POOL_SIZE:
+            pool.append(fig)
+
 
 def create_sentiment_pie(positive: int, negative: int, neutral: int,
                          figsize: tuple = (8, 6)) -> plt.Figure:
@@ -37,7 +92,8 @@ def create_sentiment_pie(positive: int, negative: int, neutral: int,
     Returns:
         Matplotlib Figure
     """
-    fig, ax = plt.subplots(figsize=figsize, facecolor='#0e1117')
+    fig = _acquire_fig(figsize)
+    ax = fig.subplots()
     ax.set_facecolor('#0e1117')
     
     # Data
@@ -73,7 +129,6 @@ def create_sentiment_pie(positive: int, negative: int, neutral: int,
     
     ax.set_title('Distribusi Sentimen', color=COLORS['text'], fontsize=16, pad=20)
     
-    plt.tight_layout()
     return fig
 
 
@@ -82,7 +137,8 @@ def create_sentiment_bar(positive: int, negative: int, neutral: int,
     """
     Create horizontal bar chart for sentiment comparison
     """
-    fig, ax = plt.subplots(figsize=figsize, facecolor='#0e1117')
+    fig = _acquire_fig(figsize)
+    ax = fig.subplots()
     ax.set_facecolor('#0e1117')
     
     categories = ['Positif', 'Negatif', 'Netral']
@@ -106,10 +162,28 @@ def create_sentiment_bar(positive: int, negative: int, neutral: int,
     ax.spines['bottom'].set_color(COLORS['text'])
     ax.spines['left'].set_color(COLORS['text'])
     
-    plt.tight_layout()
     return fig
 
 
+@lru_cache(maxsize=None)
+def _get_wordcloud(colormap: str, max_words: int) -> WordCloud:
+    """
+    Shared WordCloud per (colormap, max_words), set up once and reused.
+    The colormap is baked into the color function at construction, so
+    it is part of the key rather than patched onto one instance.
+    """
+    return WordCloud(
+        width=1200,
+        height=600,
+        background_color='#0e1117',
+        colormap=colormap,
+        max_words=max_words,
+        min_font_size=10,
+        max_font_size=150,
+        random_state=42
+    )
+
+
 def create_wordcloud(word_freq: Dict[str, int], 
                      colormap: str = 'viridis',
                      figsize: tuple = (12, 6),
@@ -126,7 +200,8 @@ def create_wordcloud(word_freq: Dict[str, int],
     Returns:
         Matplotlib Figure
     """
-    fig, ax = plt.subplots(figsize=figsize, facecolor='#0e1117')
+    fig = _acquire_fig(figsize)
+    ax = fig.subplots()
     ax.set_facecolor('#0e1117')
     
     if not word_freq:
@@ -135,23 +210,31 @@ def create_wordcloud(word_freq: Dict[str, int],
         ax.axis('off')
         return fig
     
-    # Create word cloud
-    wc = WordCloud(
-        width=1200,
-        height=600,
-        background_color='#0e1117',
-        colormap=colormap,
-        max_words=max_words,
-        min_font_size=10,
-        max_font_size=150,
-        random_state=42
-    ).generate_from_frequencies(word_freq)
+    # Create word cloud; the shared instance is not thread-safe, and
+    # Streamlit serves each session from its own thread
+    wc = _get_wordcloud(colormap, max_words)
+    layout_key = (tuple(word_freq.items()), colormap, max_words)
+    with _WORDCLOUD_LOCK:
+        layout = _WORDCLOUD_LAYOUTS.get(layout_key)
+        if layout is None:
+            # WordCloud turns random_state=42 into one Random it keeps
+            # drawing from; reseed so a reused instance lays out (and
+            # colors) like a fresh one
+            wc.random_state = Random(42)
+            layout = wc.generate_from_frequencies(word_freq).layout_
+            _WORDCLOUD_LAYOUTS[layout_key] = layout
+            if len(_WORDCLOUD_LAYOUTS) > WORDCLOUD_LAYOUT_CACHE_SIZE:
+                _WORDCLOUD_LAYOUTS.popitem(last=False)
+        else:
+            _WORDCLOUD_LAYOUTS.move_to_end(layout_key)
+            wc.layout_ = layout
+        
+        image = wc.to_array()
     
-    ax.imshow(wc, interpolation='bilinear')
+    ax.imshow(image, interpolation='bilinear')
     ax.axis('off')
     ax.set_title('Word Cloud - Kata Populer', color=COLORS['text'], fontsize=16, pad=10)
     
-    plt.tight_layout()
     return fig
 
 
@@ -167,36 +250,62 @@ def create_wordcloud_by_sentiment(results: List[Dict],
     Returns:
         Matplotlib Figure
     """
-    from utils import tokenize
+    from sentiment import get_result_tokens
     
     word_freq = {}
     for result in results:
         if result['sentiment_label'] == sentiment:
-            words = tokenize(result['cleaned_text'])
+            words = get_result_tokens(result)
             for word in words:
                 if len(word) > 2:
                     word_freq[word] = word_freq.get(word, 0) + 1
     
-    colormap = {
-        'positive': 'Greens',
-        'negative': 'Reds',
-        'neutral': 'Greys'
-    }.get(sentiment, 'viridis')
+    colormap = SENTIMENT_COLORMAPS.get(sentiment, 'viridis')
     
     return create_wordcloud(word_freq, colormap=colormap)
 
 
+def create_wordclouds_all_sentiments(results: List[Dict]) -> Dict[str, plt.Figure]:
+    """
+    Create one word cloud per sentiment in a single pass over results
+    
+    Equivalent to calling create_wordcloud_by_sentiment for each label,
+    but every result's tokens are read and counted once instead of the
+    whole list being filtered three times.
+    
+    Args:
+        results: Analysis results
+    
+    Returns:
+        Dict of sentiment label: Matplotlib Figure
+    """
+    from sentiment import get_result_tokens
+    
+    word_freqs = {sentiment: Counter() for sentiment in SENTIMENT_COLORMAPS}
+    for result in results:
+        word_freq = word_freqs.get(result['sentiment_label'])
+        if word_freq is not None:
+            word_freq.update(w for w in get_result_tokens(result) if len(w) > 2)
+    
+    return {
+        sentiment: create_wordcloud(dict(word_freq), colormap=SENTIMENT_COLORMAPS[sentiment])
+        for sentiment, word_freq in word_freqs.items()
+    }
+
+
 def create_score_histogram(results: List[Dict], 
                            figsize: tuple = (10, 5)) -> plt.Figure:
     """
     Create histogram of sentiment scores
     """
-    fig, ax = plt.subplots(figsize=figsize, facecolor='#0e1117')
+    fig = _acquire_fig(figsize)
+    ax = fig.subplots()
     ax.set_facecolor('#0e1117')
     
-    scores = [r['sentiment_score'] for r in results]
+    scores = np.fromiter((r['sentiment_score'] for r in results),
+                         dtype=np.float64, count=len(results))
     
-    if not scores:
+    if not scores.size:
         ax.text(0.5, 0.5, 'No Data', ha='center', va='center',
                 fontsize=16, color=COLORS['text'])
         return fig
@@ -204,15 +313,12 @@ def create_score_histogram(results: List[Dict],
     # Create histogram
     n, bins, patches = ax.hist(scores, bins=20, edgecolor='white', alpha=0.7)
     
-    # Color bars based on sentiment
-    for i, patch in enumerate(patches):
-        bin_center = (bins[i] + bins[i+1]) / 2
-        if bin_center > 0.1:
-            patch.set_facecolor(COLORS['positive'])
-        elif bin_center < -0.1:
-            patch.set_facecolor(COLORS['negative'])
-        else:
-            patch.set_facecolor(COLORS['neutral'])
+    # Color bars based on sentiment of their bin center
+    centers = (bins[:-1] + bins[1:]) / 2
+    bar_colors = np.where(centers > 0.1, COLORS['positive'],
+                          np.where(centers < -0.1, COLORS['negative'], COLORS['neutral']))
+    for patch, color in zip(patches, bar_colors):
+        patch.set_facecolor(color)
     
     # Add vertical lines for thresholds
     ax.axvline(x=0.1, color='green', linestyle='--', alpha=0.5, label='Threshold Positif')
@@ -230,17 +336,25 @@ def create_score_histogram(results: List[Dict],
     
     ax.legend(facecolor='#0e1117', labelcolor=COLORS['text'])
     
-    plt.tight_layout()
     return fig
 
 
+def fig_to_png(fig: plt.Figure) -> bytes:
+    """
+    Render matplotlib figure to PNG bytes
+    
+    Draws straight on an Agg canvas at the figure's own size, dpi and
+    facecolor. The create_* functions already lay out their figures, so
+    savefig's bbox_inches='tight' (an extra measuring draw) isn't needed.
+    """
+    buf = io.BytesIO()
+    FigureCanvasAgg(fig).print_png(buf)
+    return buf.getvalue()
+
+
 def fig_to_base64(fig: plt.Figure) -> str:
     """Convert matplotlib figure to base64 string"""
-    buf = io.BytesIO()
-    fig.savefig(buf, format='png', dpi=100, bbox_inches='tight',
-                facecolor=fig.get_facecolor())
-    buf.seek(0)
-    return base64.b64encode(buf.getvalue()).decode('utf-8')
+    return base64.b64encode(fig_to_png(fig)).decode('utf-8')
 
 
 # Quick test
@@ -250,6 +364,7 @@ if __name__ == "__main__":
     # Test pie chart
     fig = create_sentiment_pie(45, 30, 25)
     fig.savefig('test_pie.png', facecolor=fig.get_facecolor())
+    release_fig(fig)
     print("Created test_pie.png")
     
     # Test word cloud
@@ -259,7 +374,7 @@ if __name__ == "__main__":
     }
     fig = create_wordcloud(word_freq)
     fig.savefig('test_wordcloud.png', facecolor=fig.get_facecolor())
+    release_fig(fig)
     print("Created test_wordcloud.png")
     
-    plt.close('all')
     print("Done!")